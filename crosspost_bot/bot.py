@@ -2,17 +2,21 @@ from __future__ import annotations
 
 import asyncio
 import contextlib
+import functools
 import logging
 import threading
+import weakref
 from datetime import datetime
-from typing import Any, Optional
+from typing import Any, Awaitable, Callable, Optional
 
 import requests
 from flask import Flask, jsonify
-from telegram import InputMediaPhoto, Message, ReplyKeyboardMarkup, Update
+from telegram import Message, ReplyKeyboardMarkup, Update
 from telegram.constants import ChatAction
+from telegram.error import RetryAfter
 from telegram.ext import (
     ApplicationBuilder,
+    BaseUpdateProcessor,
     CommandHandler,
     ContextTypes,
     MessageHandler,
@@ -33,6 +37,7 @@ from crosspost_bot.database import Database
 from crosspost_bot.keyboards import (
     admin_main_keyboard,
     cancel_keyboard,
+    channel_label,
     channel_management_keyboard,
     channel_selection_keyboard,
     manage_admins_keyboard,
@@ -42,12 +47,19 @@ from crosspost_bot.keyboards import (
     user_main_keyboard,
 )
 from crosspost_bot.scheduler import ScheduledPostWorker
+from crosspost_bot.services.telegram import (
+    DOWNLOAD_CONCURRENCY,
+    download_photo,
+    send_to_telegram,
+)
 from crosspost_bot.services.vk_client import VKClient, extract_token_from_url
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
 )
+# httpx logs every getUpdates long-poll request at INFO.
+logging.getLogger("httpx").setLevel(logging.WARNING)
 LOGGER = logging.getLogger("crosspost-bot")
 
 
@@ -65,13 +77,64 @@ STATE_CHANNEL_DEACTIVATE = "channel_deactivate"
 STATE_CHANNEL_ACTIVATE = "channel_activate"
 
 ALBUM_CACHE_KEY = "album_cache"
+CHANNEL_LABELS_KEY = "channel_labels"
 ALBUM_FLUSH_DELAY = 1.0
+# Approval notices go out at most NOTIFY_CONCURRENCY / NOTIFY_INTERVAL per
+# second, well under Telegram's ~30 messages/s bot limit.
+NOTIFY_CONCURRENCY = 4
+NOTIFY_INTERVAL = 0.25
+MAX_CONCURRENT_UPDATES = 256
+VK_TOKEN_STATUS_KEY = "vk_token_ok"
+VK_TOKEN_POLL_INTERVAL = 60
 STATE_MANAGE_USERS = "manage_users"
 STATE_MANAGE_ADMINS = "manage_admins"
 STATE_ADMIN_ADD = "admin_add"
 STATE_TOKEN_UPDATE = "token_update"
 
 
+HELP_TEXT = (
+    "📘 Руководство по боту\n\n"
+    "1️⃣ Основные команды:\n"
+    "/start — регистрация и приветствие\n"
+    "/menu — показать главное меню\n"
+    "/hide — скрыть меню\n"
+    "/status — статус каналов и VK токена (админы)\n"
+    "/get_token — инструкция получения VK токена (админы)\n"
+    "/update_token — обновить VK токен (админы)\n"
+    "/stop — остановить бота (админы)\n\n"
+    "2️⃣ Главное меню:\n"
+    "📢 Опубликовать пост — выбор канала и мгновенная отправка текста/фото в Telegram и VK.\n"
+    "⏰ Отложенный пост — выбор канала, даты, времени и содержимого. Пост хранится в планировщике.\n"
+    "📋 Мои каналы — список каналов, куда у вас есть доступ.\n"
+    "ℹ️ Помощь — это руководство.\n"
+    "❌ Скрыть меню — убирает клавиатуру.\n\n"
+    "3️⃣ Возможности админов:\n"
+    "👥 Управление пользователями — одобрение новых пользователей (по одному или кнопкой "
+    "«✅ Одобрить всех») и выдача доступов.\n"
+    "👑 Управление админами — назначение/снятие статуса администратора.\n"
+    "⚙️ Управление каналами — добавление, деактивация и повторная активация каналов.\n"
+    "📊 Статус — проверка количества каналов, ожидающих пользователей и валидности VK токена.\n"
+    "🛑 Остановить бота — плановое выключение сервиса.\n\n"
+    "4️⃣ Публикация контента:\n"
+    "- Сначала выберите канал.\n"
+    "- Затем отправьте текст, одиночное фото или медиагруппу (несколько фото подряд).\n"
+    "- При отложенной публикации дополнительно выберите дату и время в формате ДД.ММ.ГГГГ ЧЧ:ММ.\n"
+    "- Бот автоматически публикует материалы в выбранном Telegram канале и связанном VK сообществе.\n\n"
+    "🕒 Часовой пояс:\n"
+    "- Время планирования интерпретируется в зоне TIMEZONE (по умолчанию Europe/Moscow).\n"
+    "- Измените переменную окружения TIMEZONE, если работаете в другом регионе.\n\n"
+    "5️⃣ Управление VK токеном:\n"
+    "- /get_token выдаёт ссылку авторизации VK.\n"
+    "- После получения токена используйте /update_token.\n"
+    "- Бот проверит токен и сохранит его для публикаций.\n\n"
+    "6️⃣ Безопасность:\n"
+    "- Только одобренные пользователи могут публиковать.\n"
+    "- Администраторы контролируют пользователей и каналы.\n"
+    "- Все действия логируются, ошибки выводятся в статусе.\n\n"
+    "Если возникают вопросы или ошибки — свяжитесь с администратором."
+)
+
+
 flask_app = Flask(__name__)
 
 
@@ -101,13 +164,25 @@ async def self_ping_loop(url: str) -> None:
     LOGGER.info("Self ping loop targeting %s", target)
     while True:
         try:
-            response = requests.get(target, timeout=10)
+            response = await asyncio.to_thread(requests.get, target, timeout=10)
             LOGGER.debug("Self ping %s -> %s", target, response.status_code)
         except Exception as exc:
             LOGGER.warning("Self ping failed: %s", exc)
         await asyncio.sleep(600)
 
 
+async def vk_token_poll_loop(application) -> None:
+    vk_client: VKClient = application.bot_data["vk_client"]
+    while True:
+        try:
+            valid = await asyncio.to_thread(vk_client.validate)
+        except Exception as exc:
+            LOGGER.warning("VK token check failed: %s", exc)
+            valid = False
+        application.bot_data[VK_TOKEN_STATUS_KEY] = valid
+        await asyncio.sleep(VK_TOKEN_POLL_INTERVAL)
+
+
 def get_main_keyboard(user: dict) -> ReplyKeyboardMarkup:
     if user.get("is_admin"):
         return admin_main_keyboard()
@@ -145,6 +220,24 @@ async def ensure_user(
     return record
 
 
+def admin_required(denied_text: str):
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(
+            update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs
+        ) -> None:
+            db: Database = context.application.bot_data["db"]
+            user = await db.get_user(update.effective_user.id)
+            if not user or not user.get("is_admin"):
+                await update.message.reply_text(denied_text)
+                return
+            await handler(update, context, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
 async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = await ensure_user(update, context)
     if not user:
@@ -182,26 +275,24 @@ async def handle_hide(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
 
 async def handle_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     db: Database = context.application.bot_data["db"]
-    vk_client: VKClient = context.application.bot_data["vk_client"]
-    channels = await db.list_channels()
-    pending = await db.list_pending_users()
-    vk_status = "валиден" if await asyncio.to_thread(vk_client.validate) else "ошибка"
+    counts = await db.status_counts()
+    vk_valid = context.application.bot_data.get(VK_TOKEN_STATUS_KEY)
+    if vk_valid is None:
+        vk_status = "проверяется"
+    else:
+        vk_status = "валиден" if vk_valid else "ошибка"
     text = (
         f"📊 Статус:\n"
-        f"- Активных каналов: {len([c for c in channels if c['is_active']])}\n"
-        f"- Отключенных каналов: {len([c for c in channels if not c['is_active']])}\n"
-        f"- Ожидают одобрения: {len(pending)}\n"
+        f"- Активных каналов: {counts['active_channels']}\n"
+        f"- Отключенных каналов: {counts['inactive_channels']}\n"
+        f"- Ожидают одобрения: {counts['pending_users']}\n"
         f"- VK токен: {vk_status}"
     )
     await update.message.reply_text(text)
 
 
+@admin_required("Команда доступна только администраторам.")
 async def handle_get_token(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    db: Database = context.application.bot_data["db"]
-    user = await db.get_user(update.effective_user.id)
-    if not user or not user.get("is_admin"):
-        await update.message.reply_text("Команда доступна только администраторам.")
-        return
     url = (
         "https://oauth.vk.com/authorize?client_id=6121396&display=page"
         "&redirect_uri=https://oauth.vk.com/blank.html&scope=offline,photos,wall,groups"
@@ -212,37 +303,34 @@ async def handle_get_token(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     )
 
 
+@admin_required("Команда доступна только администраторам.")
 async def handle_update_token(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    db: Database = context.application.bot_data["db"]
-    user = await db.get_user(update.effective_user.id)
-    if not user or not user.get("is_admin"):
-        await update.message.reply_text("Команда доступна только администраторам.")
-        return
     context.user_data["state"] = STATE_TOKEN_UPDATE
     await update.message.reply_text(
         "Отправьте новый VK токен или ссылку.", reply_markup=cancel_keyboard()
     )
 
 
+@admin_required("Команда доступна только администраторам.")
 async def handle_stop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    db: Database = context.application.bot_data["db"]
-    user = await db.get_user(update.effective_user.id)
-    if not user or not user.get("is_admin"):
-        await update.message.reply_text("Команда доступна только администраторам.")
-        return
     await update.message.reply_text("Бот останавливается по запросу администратора.")
-    await context.application.stop()
+    context.application.stop_running()
 
 
-def parse_channel_label(label: str) -> Optional[int]:
-    if "(#" in label and label.endswith(")"):
-        try:
-            return int(label.split("(#")[-1].rstrip(")"))
-        except ValueError:
-            return None
-    return None
+def remember_channel_labels(
+    context: ContextTypes.DEFAULT_TYPE, channels: list[dict]
+) -> None:
+    context.user_data[CHANNEL_LABELS_KEY] = {
+        channel_label(channel): channel for channel in channels
+    }
+
+
+def lookup_channel_label(
+    context: ContextTypes.DEFAULT_TYPE, label: str
+) -> Optional[dict]:
+    return context.user_data.get(CHANNEL_LABELS_KEY, {}).get(label)
 
 
 async def require_approval(update: Update, context, user: dict) -> bool:
@@ -273,9 +361,11 @@ async def start_post_flow(
     context.user_data["pending_post"] = {
         "scheduled": scheduled,
         "user_id": user["telegram_id"],
+        "user": user,
     }
     next_state = STATE_SCHEDULE_CHANNEL if scheduled else STATE_POST_CHANNEL
     context.user_data["state"] = next_state
+    remember_channel_labels(context, channels)
     await update.message.reply_text(
         "Выберите канал для публикации.",
         reply_markup=channel_selection_keyboard(channels),
@@ -283,109 +373,95 @@ async def start_post_flow(
 
 
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not update.message:
+    message = update.message
+    if not message:
         return
-    text = update.message.text.strip()
-    state = context.user_data.get("state", STATE_IDLE)
-    db: Database = context.application.bot_data["db"]
-    user = await db.get_user(update.effective_user.id)
+    text = message.text.strip()
+    user_data = context.user_data
+    state = user_data.get("state", STATE_IDLE)
 
     if text in ("⬅️ Назад", "❌ Отмена"):
-        context.user_data.clear()
-        context.user_data["state"] = STATE_IDLE
+        db: Database = context.application.bot_data["db"]
+        user = await db.get_user(update.effective_user.id)
+        user_data.clear()
+        user_data["state"] = STATE_IDLE
         if user:
-            await update.message.reply_text(
+            await message.reply_text(
                 "Действие отменено.", reply_markup=get_main_keyboard(user)
             )
         return
 
-    if state == STATE_IDLE:
-        await handle_menu_selection(update, context, text, user)
-    elif state == STATE_POST_CHANNEL:
-        await process_channel_selection(update, context, text, scheduled=False)
-    elif state == STATE_POST_CONTENT:
-        await process_post_content(update, context, text=text)
-    elif state == STATE_SCHEDULE_CHANNEL:
-        await process_channel_selection(update, context, text, scheduled=True)
-    elif state == STATE_SCHEDULE_DATE:
-        context.user_data.setdefault("pending_post", {})["date"] = text
-        context.user_data["state"] = STATE_SCHEDULE_TIME
-        await update.message.reply_text(
-            "Выберите время публикации.", reply_markup=schedule_time_keyboard()
-        )
-    elif state == STATE_SCHEDULE_TIME:
-        await process_schedule_time(update, context, text)
-    elif state == STATE_SCHEDULE_CONTENT:
-        await process_schedule_content(update, context, text=text)
-    elif state == STATE_CHANNEL_ADD_NAME:
-        context.user_data.setdefault("channel", {})["name"] = text
-        context.user_data["state"] = STATE_CHANNEL_ADD_TG
-        await update.message.reply_text(
-            "Введите ссылку или @username Telegram-канала.", reply_markup=cancel_keyboard()
-        )
-    elif state == STATE_CHANNEL_ADD_TG:
-        context.user_data.setdefault("channel", {})["telegram_channel"] = text
-        context.user_data["state"] = STATE_CHANNEL_ADD_VK
+    handler = STATE_HANDLERS.get(state)
+    if handler is None:
+        await message.reply_text("Неизвестное состояние. Введите /menu.")
+        return
+    await handler(update, context, text)
+
+
+async def process_post_text(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, text: str
+) -> None:
+    await process_post_content(update, context, text=text)
+
+
+async def process_schedule_text(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, text: str
+) -> None:
+    await process_schedule_content(update, context, text=text)
+
+
+async def process_schedule_date(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, text: str
+) -> None:
+    context.user_data.setdefault("pending_post", {})["date"] = text
+    context.user_data["state"] = STATE_SCHEDULE_TIME
+    await update.message.reply_text(
+        "Выберите время публикации.", reply_markup=schedule_time_keyboard()
+    )
+
+
+async def process_channel_name(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, text: str
+) -> None:
+    context.user_data.setdefault("channel", {})["name"] = text
+    context.user_data["state"] = STATE_CHANNEL_ADD_TG
+    await update.message.reply_text(
+        "Введите ссылку или @username Telegram-канала.", reply_markup=cancel_keyboard()
+    )
+
+
+async def process_channel_telegram(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, text: str
+) -> None:
+    context.user_data.setdefault("channel", {})["telegram_channel"] = text
+    context.user_data["state"] = STATE_CHANNEL_ADD_VK
+    await update.message.reply_text(
+        "Введите ID группы VK (например 123456 или club123456).",
+        reply_markup=cancel_keyboard(),
+    )
+
+
+async def process_admin_management(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, text: str
+) -> None:
+    if text == "➕ Добавить по ID":
+        context.user_data["state"] = STATE_ADMIN_ADD
         await update.message.reply_text(
-            "Введите ID группы VK (например 123456 или club123456).",
+            "Укажите Telegram ID пользователя, которого нужно назначить администратором.",
             reply_markup=cancel_keyboard(),
         )
-    elif state == STATE_CHANNEL_ADD_VK:
-        await finalize_channel_creation(update, context, text)
-    elif state == STATE_CHANNEL_DEACTIVATE:
-        await finalize_channel_toggle(update, context, text, deactivate=True)
-    elif state == STATE_CHANNEL_ACTIVATE:
-        await finalize_channel_toggle(update, context, text, deactivate=False)
-    elif state == STATE_MANAGE_USERS:
-        await finalize_user_approval(update, context, text)
-    elif state == STATE_MANAGE_ADMINS:
-        if text == "➕ Добавить по ID":
-            context.user_data["state"] = STATE_ADMIN_ADD
-            await update.message.reply_text(
-                "Укажите Telegram ID пользователя, которого нужно назначить администратором.",
-                reply_markup=cancel_keyboard(),
-            )
-        else:
-            await finalize_admin_toggle(update, context, text)
-    elif state == STATE_ADMIN_ADD:
-        await finalize_admin_add(update, context, text)
-    elif state == STATE_TOKEN_UPDATE:
-        await finalize_token_update(update, context, text)
     else:
-        await update.message.reply_text("Неизвестное состояние. Введите /menu.")
+        await finalize_admin_toggle(update, context, text)
 
 
 async def handle_menu_selection(
-    update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, user: Optional[dict]
+    update: Update, context: ContextTypes.DEFAULT_TYPE, text: str
 ) -> None:
-    if text == "📢 Опубликовать пост":
-        await start_post_flow(update, context, scheduled=False)
-    elif text == "⏰ Отложенный пост":
-        await start_post_flow(update, context, scheduled=True)
-    elif text == "📋 Мои каналы":
-        await show_user_channels(update, context)
-    elif text == "ℹ️ Помощь":
-        await show_help(update, context)
-    elif text == "📊 Статус":
-        await handle_status(update, context)
-    elif text == "❌ Скрыть меню":
-        await handle_hide(update, context)
-    elif text == "🛑 Остановить бота":
-        await handle_stop(update, context)
-    elif text == "👥 Управление пользователями":
-        await start_user_management(update, context)
-    elif text == "👑 Управление админами":
-        await start_admin_management(update, context)
-    elif text == "⚙️ Управление каналами":
-        await start_channel_management(update, context)
-    elif text == "➕ Добавить канал":
-        await start_channel_addition(update, context)
-    elif text == "➖ Удалить канал":
-        await start_channel_toggle(update, context, deactivate=True)
-    elif text == "🔄 Активировать канал":
-        await start_channel_toggle(update, context, deactivate=False)
-    else:
+    action = MENU_ACTIONS.get(text)
+    if action is None:
         await update.message.reply_text("Неизвестная команда. Используйте /menu.")
+        return
+    await action(update, context)
 
 
 async def show_user_channels(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -395,55 +471,15 @@ async def show_user_channels(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("Каналы не назначены.", reply_markup=cancel_keyboard())
         return
     lines = ["Ваши каналы:"]
-    for channel in channels:
-        lines.append(
-            f"- {channel['name']}: {channel['telegram_channel']} / VK {channel['vk_group_id']}"
-        )
+    lines.extend(
+        f"- {channel['name']}: {channel['telegram_channel']} / VK {channel['vk_group_id']}"
+        for channel in channels
+    )
     await update.message.reply_text("\n".join(lines))
 
 
 async def show_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    text = (
-        "📘 Руководство по боту\n\n"
-        "1️⃣ Основные команды:\n"
-        "/start — регистрация и приветствие\n"
-        "/menu — показать главное меню\n"
-        "/hide — скрыть меню\n"
-        "/status — статус каналов и VK токена (админы)\n"
-        "/get_token — инструкция получения VK токена (админы)\n"
-        "/update_token — обновить VK токен (админы)\n"
-        "/stop — остановить бота (админы)\n\n"
-        "2️⃣ Главное меню:\n"
-        "📢 Опубликовать пост — выбор канала и мгновенная отправка текста/фото в Telegram и VK.\n"
-        "⏰ Отложенный пост — выбор канала, даты, времени и содержимого. Пост хранится в планировщике.\n"
-        "📋 Мои каналы — список каналов, куда у вас есть доступ.\n"
-        "ℹ️ Помощь — это руководство.\n"
-        "❌ Скрыть меню — убирает клавиатуру.\n\n"
-        "3️⃣ Возможности админов:\n"
-        "👥 Управление пользователями — одобрение новых пользователей и выдача доступов.\n"
-        "👑 Управление админами — назначение/снятие статуса администратора.\n"
-        "⚙️ Управление каналами — добавление, деактивация и повторная активация каналов.\n"
-        "📊 Статус — проверка количества каналов, ожидающих пользователей и валидности VK токена.\n"
-        "🛑 Остановить бота — плановое выключение сервиса.\n\n"
-        "4️⃣ Публикация контента:\n"
-        "- Сначала выберите канал.\n"
-        "- Затем отправьте текст, одиночное фото или медиагруппу (несколько фото подряд).\n"
-        "- При отложенной публикации дополнительно выберите дату и время в формате ДД.ММ.ГГГГ ЧЧ:ММ.\n"
-        "- Бот автоматически публикует материалы в выбранном Telegram канале и связанном VK сообществе.\n\n"
-        "🕒 Часовой пояс:\n"
-        "- Время планирования интерпретируется в зоне TIMEZONE (по умолчанию Europe/Moscow).\n"
-        "- Измените переменную окружения TIMEZONE, если работаете в другом регионе.\n\n"
-        "5️⃣ Управление VK токеном:\n"
-        "- /get_token выдаёт ссылку авторизации VK.\n"
-        "- После получения токена используйте /update_token.\n"
-        "- Бот проверит токен и сохранит его для публикаций.\n\n"
-        "6️⃣ Безопасность:\n"
-        "- Только одобренные пользователи могут публиковать.\n"
-        "- Администраторы контролируют пользователей и каналы.\n"
-        "- Все действия логируются, ошибки выводятся в статусе.\n\n"
-        "Если возникают вопросы или ошибки — свяжитесь с администратором."
-    )
-    await update.message.reply_text(text)
+    await update.message.reply_text(HELP_TEXT)
 
 
 async def process_channel_selection(
@@ -453,14 +489,9 @@ async def process_channel_selection(
     *,
     scheduled: bool,
 ) -> None:
-    channel_id = parse_channel_label(text)
-    db: Database = context.application.bot_data["db"]
-    if not channel_id:
-        await update.message.reply_text("Выберите канал из списка.")
-        return
-    channel = await db.get_channel(channel_id)
+    channel = lookup_channel_label(context, text)
     if not channel:
-        await update.message.reply_text("Канал не найден.")
+        await update.message.reply_text("Выберите канал из списка.")
         return
     context.user_data.setdefault("pending_post", {})["channel"] = channel
     if scheduled:
@@ -494,20 +525,50 @@ async def process_post_content(
     text: Optional[str] = None,
     media: Optional[list[dict[str, Any]]] = None,
 ) -> None:
-    pending = context.user_data.get("pending_post")
-    if not pending:
-        await update.message.reply_text("Сначала выберите канал.")
-        return
-    channel = pending.get("channel")
+    user_data = context.user_data
+    pending = user_data.get("pending_post")
+    channel = pending.get("channel") if pending else None
     if not channel:
-        await update.message.reply_text("Канал не выбран.")
+        await update.message.reply_text(
+            "Канал не выбран." if pending else "Сначала выберите канал."
+        )
         return
     if not text and not media:
         await update.message.reply_text("Не найден текст или фото.")
         return
     await publish_now(update, context, channel, text, media)
-    context.user_data.clear()
-    context.user_data["state"] = STATE_IDLE
+    user_data.clear()
+    user_data["state"] = STATE_IDLE
+
+
+async def publish_to_vk(
+    bot,
+    vk_client: VKClient,
+    group_id: str,
+    text: Optional[str],
+    media: Optional[list[dict[str, Any]]],
+) -> None:
+    attachments = None
+    if media:
+        semaphore = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+
+        async def upload(item: dict[str, Any]) -> str:
+            unique_id = item["file_unique_id"]
+            attachment = vk_client.cached_photo(group_id, unique_id)
+            if attachment:
+                return attachment
+            async with semaphore:
+                photo = await download_photo(bot, item)
+                return await vk_client.upload_photo_async(
+                    group_id=group_id, photo=photo, cache_key=unique_id
+                )
+
+        attachments = await asyncio.gather(*(upload(item) for item in media))
+    await vk_client.post_to_group_async(
+        group_id=group_id,
+        message=text,
+        attachments=attachments,
+    )
 
 
 async def publish_now(
@@ -517,49 +578,20 @@ async def publish_now(
     text: Optional[str],
     media: Optional[list[dict[str, Any]]],
 ) -> None:
-    await context.bot.send_chat_action(
-        chat_id=update.effective_chat.id, action=ChatAction.TYPING
-    )
     bot = context.bot
     vk_client: VKClient = context.application.bot_data["vk_client"]
 
-    telegram_channel = channel["telegram_channel"]
-    vk_group_id = channel["vk_group_id"]
-
-    if media:
-        if len(media) == 1:
-            await bot.send_photo(
-                chat_id=telegram_channel,
-                photo=media[-1]["file_id"],
-                caption=text or "",
-            )
-        else:
-            group = []
-            for index, item in enumerate(media):
-                caption = text if index == 0 else None
-                group.append(
-                    InputMediaPhoto(
-                        media=item["file_id"],
-                        caption=caption,
-                    )
-                )
-            await bot.send_media_group(chat_id=telegram_channel, media=group)
-    else:
-        await bot.send_message(chat_id=telegram_channel, text=text or "")
-
-    attachments = None
-    if media:
-        attachments = []
-        for item in media:
-            telegram_file = await bot.get_file(item["file_id"])
-            data = await telegram_file.download_as_bytearray()
-            attachments.append((f"{item['file_unique_id']}.jpg", bytes(data)))
-    await asyncio.to_thread(
-        vk_client.post_to_group,
-        group_id=vk_group_id,
-        message=text,
-        photo_files=attachments,
+    *results, typing_result = await asyncio.gather(
+        send_to_telegram(bot, channel["telegram_channel"], text, media),
+        publish_to_vk(bot, vk_client, channel["vk_group_id"], text, media),
+        bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING),
+        return_exceptions=True,
     )
+    if isinstance(typing_result, Exception):
+        LOGGER.debug("Chat action failed: %s", typing_result)
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
 
     await update.message.reply_text("Пост опубликован в Telegram и VK.")
 
@@ -579,6 +611,9 @@ async def process_schedule_time(
         return
     local_tz = get_local_timezone(context)
     localized = scheduled_datetime.replace(tzinfo=local_tz)
+    if localized <= datetime.now(local_tz):
+        await update.message.reply_text("Дата должна быть в будущем.")
+        return
     pending["scheduled_for"] = localized.astimezone(UTC)
     context.user_data["state"] = STATE_SCHEDULE_CONTENT
     await update.message.reply_text(
@@ -618,10 +653,12 @@ async def process_schedule_content(
         media=media,
         scheduled_for=scheduled_for,
     )
+    scheduler: ScheduledPostWorker = context.application.bot_data["scheduler"]
+    scheduler.notify_new_post()
     local_time = scheduled_for.astimezone(get_local_timezone(context))
     await update.message.reply_text(
         f"Пост запланирован на {local_time.strftime('%d.%m.%Y %H:%M')} ({local_time.tzinfo.key}).",
-        reply_markup=get_main_keyboard(await db.get_user(update.effective_user.id)),
+        reply_markup=get_main_keyboard(pending["user"]),
     )
     context.user_data.clear()
     context.user_data["state"] = STATE_IDLE
@@ -631,37 +668,39 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     message = update.message
     if not message:
         return
-    if message.media_group_id:
-        await _buffer_media_group(update, context)
+    media_group_id = message.media_group_id
+    if media_group_id:
+        await _buffer_media_group(update, context, media_group_id)
         return
     state = context.user_data.get("state")
     media = build_media_payload(message)
+    caption = message.caption
     if state == STATE_POST_CONTENT:
-        await process_post_content(update, context, text=message.caption, media=media)
+        await process_post_content(update, context, text=caption, media=media)
     elif state == STATE_SCHEDULE_CONTENT:
-        await process_schedule_content(update, context, text=message.caption, media=media)
+        await process_schedule_content(update, context, text=caption, media=media)
     else:
         await message.reply_text("Отправьте команду из меню перед загрузкой медиа.")
 
 
-async def _buffer_media_group(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def _buffer_media_group(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, media_group_id: str
+) -> None:
     message = update.message
-    if not message or not message.media_group_id:
-        return
     cache = context.chat_data.setdefault(ALBUM_CACHE_KEY, {})
     entry = cache.setdefault(
-        message.media_group_id,
-        {"media": [], "caption": None, "task": None, "state": None},
+        media_group_id,
+        {"media": [], "caption": None, "task": None},
     )
     entry["media"].extend(build_media_payload(message))
-    if message.caption:
-        entry["caption"] = message.caption
-    entry["state"] = context.user_data.get("state")
+    caption = message.caption
+    if caption:
+        entry["caption"] = caption
     task: asyncio.Task | None = entry.get("task")
     if task:
         task.cancel()
     entry["task"] = context.application.create_task(
-        _finalize_media_group(update, context, message.media_group_id)
+        _finalize_media_group(update, context, media_group_id)
     )
 
 
@@ -672,11 +711,29 @@ async def _finalize_media_group(
         await asyncio.sleep(ALBUM_FLUSH_DELAY)
     except asyncio.CancelledError:
         return
+    # The flush runs outside update processing, so take the user's update lock
+    # to serialize it with their other messages.
+    processor = context.application.update_processor
+    if isinstance(processor, PerUserUpdateProcessor):
+        lock = processor.lock_for(update)
+    else:
+        lock = contextlib.nullcontext()
+    # If a later photo of the album cancels us while we wait for the lock, the
+    # entry is still cached and that photo's flush takes over.
+    async with lock:
+        await _flush_media_group(update, context, media_group_id)
+
+
+async def _flush_media_group(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, media_group_id: str
+) -> None:
     cache = context.chat_data.get(ALBUM_CACHE_KEY, {})
     entry = cache.pop(media_group_id, None)
     if not entry:
         return
-    state = entry.get("state")
+    # Read the state now, under the lock: a message handled since the album
+    # arrived may already have published and reset it.
+    state = context.user_data.get("state")
     caption = entry.get("caption")
     media = entry.get("media", [])
     if state == STATE_POST_CONTENT:
@@ -689,34 +746,72 @@ async def _finalize_media_group(
         )
 
 
+@admin_required("Доступно только администраторам.")
 async def start_user_management(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
     db: Database = context.application.bot_data["db"]
-    user = await db.get_user(update.effective_user.id)
-    if not user or not user.get("is_admin"):
-        await update.message.reply_text("Доступно только администраторам.")
-        return
     pending = await db.list_pending_users()
     if not pending:
         await update.message.reply_text("Нет ожидающих пользователей.")
         return
     context.user_data["state"] = STATE_MANAGE_USERS
     await update.message.reply_text(
-        "Нажмите на ID пользователя для одобрения или '🚫 Отклонить' "
-        "и укажите ID в следующем сообщении.",
+        "Нажмите на ID пользователя для одобрения, '✅ Одобрить всех' "
+        "или '🚫 Отклонить' и укажите ID в следующем сообщении.",
         reply_markup=manage_users_keyboard(pending),
     )
 
 
+async def notify_approved(
+    context: ContextTypes.DEFAULT_TYPE, telegram_ids: list[int]
+) -> None:
+    semaphore = asyncio.Semaphore(NOTIFY_CONCURRENCY)
+
+    async def notify(telegram_id: int) -> None:
+        async with semaphore:
+            for attempt in range(2):
+                try:
+                    await context.bot.send_message(
+                        chat_id=telegram_id,
+                        text="Ваша учетная запись одобрена. Введите /menu.",
+                    )
+                    break
+                except RetryAfter as exc:
+                    if attempt:
+                        raise
+                    await asyncio.sleep(exc.retry_after)
+            await asyncio.sleep(NOTIFY_INTERVAL)
+
+    results = await asyncio.gather(
+        *(notify(telegram_id) for telegram_id in telegram_ids),
+        return_exceptions=True,
+    )
+    for telegram_id, result in zip(telegram_ids, results):
+        if isinstance(result, Exception):
+            LOGGER.warning("Failed to notify user %s: %s", telegram_id, result)
+
+
 async def finalize_user_approval(
     update: Update, context: ContextTypes.DEFAULT_TYPE, text: str
 ) -> None:
     db: Database = context.application.bot_data["db"]
-    if text.startswith("✅"):
+    if text == "✅ Одобрить всех":
+        telegram_ids = [u["telegram_id"] for u in await db.list_pending_users()]
+        if telegram_ids:
+            await db.approve_users(telegram_ids)
+            # The paced broadcast can take a while; don't hold the admin's menu.
+            context.application.create_task(
+                notify_approved(context, telegram_ids), update=update
+            )
+        await update.message.reply_text(f"Одобрено пользователей: {len(telegram_ids)}.")
+    elif text.startswith("✅"):
         telegram_id = int(text.split("✅")[1].strip())
         await db.approve_user(telegram_id, True)
         await db.grant_all_channels(telegram_id)
+        context.application.create_task(
+            notify_approved(context, [telegram_id]), update=update
+        )
         await update.message.reply_text(f"Пользователь {telegram_id} одобрен.")
     elif text.startswith("🚫"):
         await update.message.reply_text("Укажите ID пользователя после 🚫.")
@@ -731,14 +826,11 @@ async def finalize_user_approval(
     context.user_data["state"] = STATE_IDLE
 
 
+@admin_required("Недостаточно прав.")
 async def start_admin_management(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
     db: Database = context.application.bot_data["db"]
-    user = await db.get_user(update.effective_user.id)
-    if not user or not user.get("is_admin"):
-        await update.message.reply_text("Недостаточно прав.")
-        return
     users = await db.list_users()
     context.user_data["state"] = STATE_MANAGE_ADMINS
     await update.message.reply_text(
@@ -762,8 +854,7 @@ async def finalize_admin_toggle(
         await update.message.reply_text("Пользователь не найден.")
         return
     if user["is_admin"]:
-        admins = [u for u in await db.list_users() if u["is_admin"]]
-        if len(admins) == 1:
+        if await db.count_admins() == 1:
             await update.message.reply_text("Нельзя удалить последнего администратора.")
             return
     await db.set_admin(telegram_id, not user["is_admin"])
@@ -794,28 +885,20 @@ async def finalize_admin_add(
     context.user_data["state"] = STATE_IDLE
 
 
+@admin_required("Недостаточно прав.")
 async def start_channel_management(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    db: Database = context.application.bot_data["db"]
-    user = await db.get_user(update.effective_user.id)
-    if not user or not user.get("is_admin"):
-        await update.message.reply_text("Недостаточно прав.")
-        return
     context.user_data["state"] = STATE_IDLE
     await update.message.reply_text(
         "Выберите действие с каналами.", reply_markup=channel_management_keyboard()
     )
 
 
+@admin_required("Недостаточно прав.")
 async def start_channel_addition(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    db: Database = context.application.bot_data["db"]
-    user = await db.get_user(update.effective_user.id)
-    if not user or not user.get("is_admin"):
-        await update.message.reply_text("Недостаточно прав.")
-        return
     context.user_data["channel"] = {}
     context.user_data["state"] = STATE_CHANNEL_ADD_NAME
     await update.message.reply_text(
@@ -823,6 +906,7 @@ async def start_channel_addition(
     )
 
 
+@admin_required("Недостаточно прав.")
 async def start_channel_toggle(
     update: Update,
     context: ContextTypes.DEFAULT_TYPE,
@@ -830,23 +914,20 @@ async def start_channel_toggle(
     deactivate: bool,
 ) -> None:
     db: Database = context.application.bot_data["db"]
-    user = await db.get_user(update.effective_user.id)
-    if not user or not user.get("is_admin"):
-        await update.message.reply_text("Недостаточно прав.")
-        return
     if deactivate:
         channels = await db.list_channels(active_only=True)
     else:
         channels = [c for c in await db.list_channels(active_only=False) if not c["is_active"]]
     if not channels:
         await update.message.reply_text(
-            "Нет каналов для изменения статуса.", reply_markup=get_main_keyboard(user)
+            "Нет каналов для изменения статуса.", reply_markup=admin_main_keyboard()
         )
         return
     selection_state = (
         STATE_CHANNEL_DEACTIVATE if deactivate else STATE_CHANNEL_ACTIVATE
     )
     context.user_data["state"] = selection_state
+    remember_channel_labels(context, channels)
     await update.message.reply_text(
         "Выберите канал из списка.",
         reply_markup=channel_selection_keyboard(channels),
@@ -878,16 +959,21 @@ async def finalize_channel_toggle(
     deactivate: bool,
 ) -> None:
     db: Database = context.application.bot_data["db"]
-    try:
-        channel_id = int(text.split("#")[-1].rstrip(")")) if "(#" in text else int(text)
-    except ValueError:
-        await update.message.reply_text("Введите корректный ID канала.")
-        return
+    channel = lookup_channel_label(context, text)
+    if channel:
+        channel_id = channel["id"]
+    else:
+        try:
+            channel_id = int(text)
+        except ValueError:
+            await update.message.reply_text("Введите корректный ID канала.")
+            return
     await db.deactivate_channel(channel_id, active=not deactivate)
     await update.message.reply_text(
         f"Канал {'деактивирован' if deactivate else 'активирован'}."
     )
     context.user_data["state"] = STATE_IDLE
+    context.user_data.pop(CHANNEL_LABELS_KEY, None)
 
 
 async def finalize_token_update(
@@ -899,13 +985,51 @@ async def finalize_token_update(
         await update.message.reply_text("Не удалось определить токен.")
         return
     await asyncio.to_thread(vk_client.update_token, token)
-    if await asyncio.to_thread(vk_client.validate):
+    valid = await asyncio.to_thread(vk_client.validate)
+    context.application.bot_data[VK_TOKEN_STATUS_KEY] = valid
+    if valid:
         await update.message.reply_text("VK токен обновлен.")
     else:
         await update.message.reply_text("Токен сохранен, но проверка провалена.")
     context.user_data["state"] = STATE_IDLE
 
 
+MENU_ACTIONS: dict[str, Callable[..., Awaitable[None]]] = {
+    "📢 Опубликовать пост": functools.partial(start_post_flow, scheduled=False),
+    "⏰ Отложенный пост": functools.partial(start_post_flow, scheduled=True),
+    "📋 Мои каналы": show_user_channels,
+    "ℹ️ Помощь": show_help,
+    "📊 Статус": handle_status,
+    "❌ Скрыть меню": handle_hide,
+    "🛑 Остановить бота": handle_stop,
+    "👥 Управление пользователями": start_user_management,
+    "👑 Управление админами": start_admin_management,
+    "⚙️ Управление каналами": start_channel_management,
+    "➕ Добавить канал": start_channel_addition,
+    "➖ Удалить канал": functools.partial(start_channel_toggle, deactivate=True),
+    "🔄 Активировать канал": functools.partial(start_channel_toggle, deactivate=False),
+}
+
+STATE_HANDLERS: dict[str, Callable[..., Awaitable[None]]] = {
+    STATE_IDLE: handle_menu_selection,
+    STATE_POST_CHANNEL: functools.partial(process_channel_selection, scheduled=False),
+    STATE_POST_CONTENT: process_post_text,
+    STATE_SCHEDULE_CHANNEL: functools.partial(process_channel_selection, scheduled=True),
+    STATE_SCHEDULE_DATE: process_schedule_date,
+    STATE_SCHEDULE_TIME: process_schedule_time,
+    STATE_SCHEDULE_CONTENT: process_schedule_text,
+    STATE_CHANNEL_ADD_NAME: process_channel_name,
+    STATE_CHANNEL_ADD_TG: process_channel_telegram,
+    STATE_CHANNEL_ADD_VK: finalize_channel_creation,
+    STATE_CHANNEL_DEACTIVATE: functools.partial(finalize_channel_toggle, deactivate=True),
+    STATE_CHANNEL_ACTIVATE: functools.partial(finalize_channel_toggle, deactivate=False),
+    STATE_MANAGE_USERS: finalize_user_approval,
+    STATE_MANAGE_ADMINS: process_admin_management,
+    STATE_ADMIN_ADD: finalize_admin_add,
+    STATE_TOKEN_UPDATE: finalize_token_update,
+}
+
+
 async def post_init(application) -> None:
     settings: Settings = application.bot_data["settings"]
     db: Database = application.bot_data["db"]
@@ -916,6 +1040,9 @@ async def post_init(application) -> None:
     scheduler.start()
     application.bot_data["scheduler"] = scheduler
     application.bot_data["flask_thread"] = start_flask_server(settings.flask_port)
+    application.bot_data["vk_token_task"] = asyncio.create_task(
+        vk_token_poll_loop(application)
+    )
     if settings.render and settings.self_ping_url:
         task = asyncio.create_task(self_ping_loop(settings.self_ping_url))
         application.bot_data["self_ping_task"] = task
@@ -925,19 +1052,63 @@ async def post_shutdown(application) -> None:
     scheduler: ScheduledPostWorker = application.bot_data.get("scheduler")
     if scheduler:
         await scheduler.stop()
-    task: asyncio.Task | None = application.bot_data.get("self_ping_task")
-    if task:
-        task.cancel()
-        with contextlib.suppress(asyncio.CancelledError):
-            await task
+    for key in ("vk_token_task", "self_ping_task"):
+        task: asyncio.Task | None = application.bot_data.get(key)
+        if task:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+    application.bot_data["vk_client"].close()
     db: Database = application.bot_data["db"]
     await db.close()
 
 
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Run updates concurrently across users but one at a time per user.
+
+    The conversation state lives in user_data and is only reset after the
+    publish/schedule awaits, so a user's next message must wait its turn.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # Locks are dropped once no pending update of that user holds them.
+        self._locks: weakref.WeakValueDictionary[int, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
+
+    def lock_for(self, update: object) -> asyncio.Lock | contextlib.nullcontext:
+        """Return the lock serializing this update's user, if it has one."""
+        key = None
+        if isinstance(update, Update):
+            if update.effective_user:
+                key = update.effective_user.id
+            elif update.effective_chat:
+                key = update.effective_chat.id
+        if key is None:
+            return contextlib.nullcontext()
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[key] = lock
+        return lock
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        async with self.lock_for(update):
+            await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
 def build_application(settings: Settings) -> Any:
     application = (
         ApplicationBuilder()
         .token(settings.telegram_token)
+        .concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES))
         .post_init(post_init)
         .post_shutdown(post_shutdown)
         .build()
@@ -963,6 +1134,7 @@ def register_handlers(application) -> None:
 
 def main() -> None:
     settings = Settings.load()
+    logging.getLogger().setLevel(settings.log_level)
     db = Database(settings.database_url)
     vk_client = VKClient(settings.vk_token)
     application = build_application(settings)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import logging
 import os
 from dataclasses import dataclass
 from pathlib import Path
@@ -17,17 +18,20 @@ class Settings:
     self_ping_url: Optional[str] = None
     flask_port: int = 8000
     timezone: str = "UTC"
+    log_level: str = "INFO"
 
     @classmethod
     def load(cls) -> "Settings":
         env_path = Path(__file__).resolve().parents[1] / ".env"
         if env_path.exists():
             load_dotenv(env_path)
-        load_dotenv(override=False)
+        else:
+            load_dotenv(override=False)
 
-        telegram_token = os.getenv("TELEGRAM_TOKEN")
-        vk_token = os.getenv("VK_TOKEN")
-        database_url = os.getenv("DATABASE_URL")
+        env = os.environ
+        telegram_token = env.get("TELEGRAM_TOKEN")
+        vk_token = env.get("VK_TOKEN")
+        database_url = env.get("DATABASE_URL")
 
         missing = [name for name, value in
                    (("TELEGRAM_TOKEN", telegram_token),
@@ -37,15 +41,22 @@ class Settings:
         if missing:
             raise RuntimeError(f"Missing environment variables: {', '.join(missing)}")
 
+        log_level = env.get("LOG_LEVEL", "INFO").upper()
+        if not isinstance(logging.getLevelName(log_level), int):
+            raise RuntimeError(
+                f"Invalid LOG_LEVEL {log_level!r}; use DEBUG, INFO, WARNING, ERROR or CRITICAL"
+            )
+
         return cls(
             telegram_token=telegram_token,
             vk_token=vk_token,
             database_url=database_url,
-            render=os.getenv("RENDER", "false").lower() == "true",
-            self_ping_url=os.getenv("SELF_PING_URL")
-            or os.getenv("RENDER_EXTERNAL_URL"),
-            flask_port=int(os.getenv("PORT", "8000")),
-            timezone=os.getenv("TIMEZONE", "Europe/Moscow"),
+            render=env.get("RENDER", "false").lower() == "true",
+            self_ping_url=env.get("SELF_PING_URL")
+            or env.get("RENDER_EXTERNAL_URL"),
+            flask_port=int(env.get("PORT", "8000")),
+            timezone=env.get("TIMEZONE", "Europe/Moscow"),
+            log_level=log_level,
         )
 
 
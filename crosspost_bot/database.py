@@ -3,6 +3,7 @@ from __future__ import annotations
 import asyncio
 import logging
 from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
 from typing import Any, Iterable, Optional
 
 import psycopg
@@ -13,6 +14,64 @@ from psycopg.types.json import Json
 
 LOGGER = logging.getLogger(__name__)
 
+# A 'processing' claim older than this is assumed to belong to a dead worker.
+CLAIM_LEASE = timedelta(minutes=10)
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        telegram_id BIGINT PRIMARY KEY,
+        username TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        is_admin BOOLEAN DEFAULT FALSE,
+        is_approved BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMPTZ DEFAULT NOW()
+    );
+
+    CREATE INDEX IF NOT EXISTS ix_users_admin
+    ON users (telegram_id) WHERE is_admin = TRUE;
+
+    CREATE INDEX IF NOT EXISTS ix_users_pending
+    ON users (created_at) WHERE is_approved = FALSE;
+
+    CREATE TABLE IF NOT EXISTS channels (
+        id SERIAL PRIMARY KEY,
+        name TEXT NOT NULL,
+        telegram_channel TEXT NOT NULL,
+        vk_group_id TEXT NOT NULL,
+        is_active BOOLEAN DEFAULT TRUE,
+        created_at TIMESTAMPTZ DEFAULT NOW()
+    );
+
+    CREATE TABLE IF NOT EXISTS user_permissions (
+        id SERIAL PRIMARY KEY,
+        telegram_id BIGINT REFERENCES users (telegram_id) ON DELETE CASCADE,
+        channel_id INT REFERENCES channels (id) ON DELETE CASCADE,
+        UNIQUE (telegram_id, channel_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS scheduled_posts (
+        id SERIAL PRIMARY KEY,
+        channel_id INT REFERENCES channels (id) ON DELETE CASCADE,
+        user_id BIGINT REFERENCES users (telegram_id) ON DELETE SET NULL,
+        text TEXT,
+        media JSONB,
+        scheduled_for TIMESTAMPTZ NOT NULL,
+        status TEXT DEFAULT 'pending',
+        created_at TIMESTAMPTZ DEFAULT NOW(),
+        sent_at TIMESTAMPTZ,
+        claimed_at TIMESTAMPTZ
+    );
+
+    ALTER TABLE scheduled_posts ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMPTZ;
+
+    CREATE INDEX IF NOT EXISTS ix_scheduled_pending
+    ON scheduled_posts (scheduled_for) WHERE status = 'pending';
+
+    CREATE INDEX IF NOT EXISTS ix_scheduled_processing
+    ON scheduled_posts (claimed_at) WHERE status = 'processing';
+"""
+
 
 class Database:
     """Async helper around psycopg connection pool."""
@@ -30,7 +89,9 @@ class Database:
             max_size=10,
             num_workers=3,
             kwargs={"autocommit": True},
+            open=False,
         )
+        await self._pool.open(wait=True)
         await self.create_tables()
         LOGGER.info("Connected to PostgreSQL")
 
@@ -47,6 +108,15 @@ class Database:
             async with conn.cursor(row_factory=dict_row) as cursor:
                 yield cursor
 
+    @asynccontextmanager
+    async def transaction(self):
+        if not self._pool:
+            raise RuntimeError("Database pool is not initialized")
+        async with self._pool.connection() as conn:
+            async with conn.transaction():
+                async with conn.cursor(row_factory=dict_row) as cursor:
+                    yield cursor
+
     async def execute(
         self,
         query: str,
@@ -54,9 +124,10 @@ class Database:
         *,
         fetchone: bool = False,
         fetchall: bool = False,
+        prepare: Optional[bool] = None,
     ) -> Any:
         async with self.connection() as cursor:
-            await cursor.execute(query, params or ())
+            await cursor.execute(query, params or (), prepare=prepare)
             if fetchone:
                 return await cursor.fetchone()
             if fetchall:
@@ -64,56 +135,8 @@ class Database:
             return None
 
     async def create_tables(self) -> None:
-        await self.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                telegram_id BIGINT PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                is_admin BOOLEAN DEFAULT FALSE,
-                is_approved BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMPTZ DEFAULT NOW()
-            );
-            """
-        )
-        await self.execute(
-            """
-            CREATE TABLE IF NOT EXISTS channels (
-                id SERIAL PRIMARY KEY,
-                name TEXT NOT NULL,
-                telegram_channel TEXT NOT NULL,
-                vk_group_id TEXT NOT NULL,
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMPTZ DEFAULT NOW()
-            );
-            """
-        )
-        await self.execute(
-            """
-            CREATE TABLE IF NOT EXISTS user_permissions (
-                id SERIAL PRIMARY KEY,
-                telegram_id BIGINT REFERENCES users (telegram_id) ON DELETE CASCADE,
-                channel_id INT REFERENCES channels (id) ON DELETE CASCADE,
-                UNIQUE (telegram_id, channel_id)
-            );
-            """
-        )
-        await self.execute(
-            """
-            CREATE TABLE IF NOT EXISTS scheduled_posts (
-                id SERIAL PRIMARY KEY,
-                channel_id INT REFERENCES channels (id) ON DELETE CASCADE,
-                user_id BIGINT REFERENCES users (telegram_id) ON DELETE SET NULL,
-                text TEXT,
-                media JSONB,
-                scheduled_for TIMESTAMPTZ NOT NULL,
-                status TEXT DEFAULT 'pending',
-                created_at TIMESTAMPTZ DEFAULT NOW(),
-                sent_at TIMESTAMPTZ
-            );
-            """
-        )
+        async with self.transaction() as cursor:
+            await cursor.execute(SCHEMA)
 
     # User helpers
 
@@ -136,6 +159,7 @@ class Database:
             """,
             (telegram_id, username, first_name, last_name),
             fetchone=True,
+            prepare=True,
         )
         return record
 
@@ -144,6 +168,7 @@ class Database:
             "SELECT * FROM users WHERE telegram_id = %s;",
             (telegram_id,),
             fetchone=True,
+            prepare=True,
         )
 
     async def list_users(self) -> list[dict[str, Any]]:
@@ -152,12 +177,6 @@ class Database:
             fetchall=True,
         )
 
-    async def list_approved_users(self) -> list[dict[str, Any]]:
-        return await self.execute(
-            "SELECT * FROM users WHERE is_approved = TRUE ORDER BY created_at;",
-            fetchall=True,
-        )
-
     async def any_admins(self) -> bool:
         record = await self.execute(
             "SELECT EXISTS (SELECT 1 FROM users WHERE is_admin = TRUE);",
@@ -165,6 +184,13 @@ class Database:
         )
         return bool(record and record["exists"])
 
+    async def count_admins(self) -> int:
+        record = await self.execute(
+            "SELECT COUNT(*) AS count FROM users WHERE is_admin = TRUE;",
+            fetchone=True,
+        )
+        return record["count"] if record else 0
+
     async def list_pending_users(self) -> list[dict[str, Any]]:
         return await self.execute(
             "SELECT * FROM users WHERE is_approved = FALSE ORDER BY created_at;",
@@ -177,6 +203,24 @@ class Database:
             (approved, telegram_id),
         )
 
+    async def approve_users(self, telegram_ids: list[int]) -> None:
+        await self.execute(
+            """
+            WITH approved AS (
+                UPDATE users SET is_approved = TRUE
+                WHERE telegram_id = ANY(%s)
+                RETURNING telegram_id
+            )
+            INSERT INTO user_permissions (telegram_id, channel_id)
+            SELECT a.telegram_id, c.id
+            FROM approved a
+            CROSS JOIN channels c
+            WHERE c.is_active = TRUE
+            ON CONFLICT DO NOTHING;
+            """,
+            (telegram_ids,),
+        )
+
     async def set_admin(self, telegram_id: int, is_admin: bool) -> None:
         await self.execute(
             "UPDATE users SET is_admin = %s WHERE telegram_id = %s;",
@@ -212,10 +256,14 @@ class Database:
         query += " ORDER BY name;"
         return await self.execute(query, fetchall=True)
 
-    async def get_channel(self, channel_id: int) -> Optional[dict[str, Any]]:
+    async def status_counts(self) -> dict[str, int]:
         return await self.execute(
-            "SELECT * FROM channels WHERE id = %s;",
-            (channel_id,),
+            """
+            SELECT
+                (SELECT COUNT(*) FROM channels WHERE is_active = TRUE) AS active_channels,
+                (SELECT COUNT(*) FROM channels WHERE is_active = FALSE) AS inactive_channels,
+                (SELECT COUNT(*) FROM users WHERE is_approved = FALSE) AS pending_users;
+            """,
             fetchone=True,
         )
 
@@ -227,16 +275,6 @@ class Database:
 
     # Permissions
 
-    async def grant_permissions(self, telegram_id: int, channel_id: int) -> None:
-        await self.execute(
-            """
-            INSERT INTO user_permissions (telegram_id, channel_id)
-            VALUES (%s, %s)
-            ON CONFLICT DO NOTHING;
-            """,
-            (telegram_id, channel_id),
-        )
-
     async def revoke_permissions(self, telegram_id: int, channel_id: int) -> None:
         await self.execute(
             "DELETE FROM user_permissions WHERE telegram_id = %s AND channel_id = %s;",
@@ -254,17 +292,28 @@ class Database:
             """,
             (telegram_id,),
             fetchall=True,
+            prepare=True,
         )
 
     async def grant_all_channels(self, telegram_id: int) -> None:
-        channels = await self.list_channels(active_only=True)
-        for channel in channels:
-            await self.grant_permissions(telegram_id, channel["id"])
+        await self.execute(
+            """
+            INSERT INTO user_permissions (telegram_id, channel_id)
+            SELECT %s, id FROM channels WHERE is_active = TRUE
+            ON CONFLICT DO NOTHING;
+            """,
+            (telegram_id,),
+        )
 
     async def grant_channel_to_all(self, channel_id: int) -> None:
-        users = await self.list_approved_users()
-        for user in users:
-            await self.grant_permissions(user["telegram_id"], channel_id)
+        await self.execute(
+            """
+            INSERT INTO user_permissions (telegram_id, channel_id)
+            SELECT telegram_id, %s FROM users WHERE is_approved = TRUE
+            ON CONFLICT DO NOTHING;
+            """,
+            (channel_id,),
+        )
 
     # Scheduled posts
 
@@ -291,26 +340,56 @@ class Database:
         return record
 
     async def due_posts(self) -> list[dict[str, Any]]:
+        """Claim up to 25 due posts by moving them to the 'processing' status."""
         return await self.execute(
             """
-            SELECT sp.*, c.telegram_channel, c.vk_group_id
-            FROM scheduled_posts sp
-            JOIN channels c ON sp.channel_id = c.id
-            WHERE sp.status = 'pending' AND sp.scheduled_for <= NOW()
-            ORDER BY sp.scheduled_for
-            LIMIT 25;
+            WITH due AS (
+                SELECT id
+                FROM scheduled_posts
+                WHERE status = 'pending' AND scheduled_for <= NOW()
+                ORDER BY scheduled_for
+                LIMIT 25
+                FOR UPDATE SKIP LOCKED
+            ), claimed AS (
+                UPDATE scheduled_posts sp
+                SET status = 'processing', claimed_at = NOW()
+                FROM due, channels c
+                WHERE sp.id = due.id AND c.id = sp.channel_id
+                RETURNING sp.*, c.telegram_channel, c.vk_group_id
+            )
+            SELECT * FROM claimed ORDER BY scheduled_for;
             """,
             fetchall=True,
         )
 
-    async def mark_post_sent(self, post_id: int, status: str = "sent") -> None:
+    async def next_due_at(self) -> Optional[datetime]:
+        record = await self.execute(
+            "SELECT MIN(scheduled_for) AS next_due FROM scheduled_posts WHERE status = 'pending';",
+            fetchone=True,
+        )
+        return record["next_due"] if record else None
+
+    async def release_claimed_posts(self) -> None:
+        """Requeue 'processing' posts whose claim has outlived CLAIM_LEASE."""
+        await self.execute(
+            """
+            UPDATE scheduled_posts
+            SET status = 'pending', claimed_at = NULL
+            WHERE status = 'processing'
+              AND (claimed_at IS NULL OR claimed_at < NOW() - %s);
+            """,
+            (CLAIM_LEASE,),
+        )
+
+    async def mark_posts_sent(self, post_ids: list[int], status: str = "sent") -> None:
         await self.execute(
             """
             UPDATE scheduled_posts
             SET status = %s, sent_at = NOW()
-            WHERE id = %s;
+            WHERE id = ANY(%s);
             """,
-            (status, post_id),
+            (status, post_ids),
+            prepare=True,
         )
 
 
@@ -1,11 +1,17 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from datetime import date, timedelta
+from functools import lru_cache
 from typing import Iterable
 
 from telegram import KeyboardButton, ReplyKeyboardMarkup
 
 
+def _chunk(labels: list[str] | tuple[str, ...], size: int) -> list[list[str]]:
+    return [list(labels[i:i + size]) for i in range(0, len(labels), size)]
+
+
 def build_keyboard(rows: list[list[str]], *, resize: bool = True) -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         [[KeyboardButton(text) for text in row] for row in rows],
@@ -14,111 +20,107 @@ def build_keyboard(rows: list[list[str]], *, resize: bool = True) -> ReplyKeyboa
     )
 
 
-def admin_main_keyboard() -> ReplyKeyboardMarkup:
-    rows = [
+_ADMIN_MAIN_KEYBOARD = build_keyboard(
+    [
         ["📢 Опубликовать пост", "⏰ Отложенный пост"],
         ["📋 Мои каналы", "👥 Управление пользователями"],
         ["⚙️ Управление каналами", "👑 Управление админами"],
         ["📊 Статус", "ℹ️ Помощь"],
         ["🛑 Остановить бота", "❌ Скрыть меню"],
     ]
-    return build_keyboard(rows)
-
-
-def user_main_keyboard() -> ReplyKeyboardMarkup:
-    rows = [
+)
+_USER_MAIN_KEYBOARD = build_keyboard(
+    [
         ["📢 Опубликовать пост", "⏰ Отложенный пост"],
         ["📋 Мои каналы", "ℹ️ Помощь"],
         ["❌ Скрыть меню"],
     ]
-    return build_keyboard(rows)
+)
+_CHANNEL_MANAGEMENT_KEYBOARD = build_keyboard(
+    [
+        ["➕ Добавить канал", "➖ Удалить канал"],
+        ["🔄 Активировать канал", "⬅️ Назад"],
+    ]
+)
+_CANCEL_KEYBOARD = build_keyboard([["⬅️ Назад", "❌ Отмена"]])
+
+# Channel lists change rarely, so selection keyboards are memoized by their
+# labels and evicted in LRU order.
+_SELECTION_CACHE_SIZE = 256
+_selection_cache: OrderedDict[tuple[str, ...], ReplyKeyboardMarkup] = OrderedDict()
+
+
+def admin_main_keyboard() -> ReplyKeyboardMarkup:
+    return _ADMIN_MAIN_KEYBOARD
+
+
+def user_main_keyboard() -> ReplyKeyboardMarkup:
+    return _USER_MAIN_KEYBOARD
 
 
 def cancel_keyboard() -> ReplyKeyboardMarkup:
-    return build_keyboard([["⬅️ Назад", "❌ Отмена"]])
+    return _CANCEL_KEYBOARD
+
+
+def channel_label(channel: dict) -> str:
+    return f"{channel['name']} (#{channel['id']})"
 
 
 def channel_selection_keyboard(channels: Iterable[dict]) -> ReplyKeyboardMarkup:
-    rows: list[list[str]] = []
-    row: list[str] = []
-    for channel in channels:
-        label = f"{channel['name']} (#{channel['id']})"
-        row.append(label)
-        if len(row) == 2:
-            rows.append(row)
-            row = []
-    if row:
-        rows.append(row)
+    labels = tuple(channel_label(channel) for channel in channels)
+    markup = _selection_cache.get(labels)
+    if markup is not None:
+        _selection_cache.move_to_end(labels)
+        return markup
+    rows = _chunk(labels, 2)
     rows.append(["⬅️ Назад", "❌ Отмена"])
-    return build_keyboard(rows)
+    markup = build_keyboard(rows)
+    _selection_cache[labels] = markup
+    if len(_selection_cache) > _SELECTION_CACHE_SIZE:
+        _selection_cache.popitem(last=False)
+    return markup
 
 
 def manage_users_keyboard(pending_users: Iterable[dict]) -> ReplyKeyboardMarkup:
-    rows: list[list[str]] = []
-    row: list[str] = []
-    for user in pending_users:
-        row.append(f"✅ {user['telegram_id']}")
-        if len(row) == 2:
-            rows.append(row)
-            row = []
-    if row:
-        rows.append(row)
+    rows = _chunk([f"✅ {user['telegram_id']}" for user in pending_users], 2)
+    rows.append(["✅ Одобрить всех"])
     rows.append(["🚫 Отклонить", "⬅️ Назад"])
     return build_keyboard(rows)
 
 
 def manage_admins_keyboard(users: Iterable[dict]) -> ReplyKeyboardMarkup:
-    rows: list[list[str]] = []
-    row: list[str] = []
-    for user in users:
-        prefix = "👑" if user["is_admin"] else "➕"
-        row.append(f"{prefix} {user['telegram_id']}")
-        if len(row) == 2:
-            rows.append(row)
-            row = []
-    if row:
-        rows.append(row)
+    labels = [
+        f"{'👑' if user['is_admin'] else '➕'} {user['telegram_id']}" for user in users
+    ]
+    rows = _chunk(labels, 2)
     rows.append(["➕ Добавить по ID", "⬅️ Назад"])
     return build_keyboard(rows)
 
 
 def channel_management_keyboard() -> ReplyKeyboardMarkup:
-    rows = [
-        ["➕ Добавить канал", "➖ Удалить канал"],
-        ["🔄 Активировать канал", "⬅️ Назад"],
-    ]
-    return build_keyboard(rows)
+    return _CHANNEL_MANAGEMENT_KEYBOARD
 
 
 def schedule_date_keyboard(days: int = 5) -> ReplyKeyboardMarkup:
-    today = datetime.now()
-    rows: list[list[str]] = []
-    row: list[str] = []
-    for offset in range(days):
-        date = (today + timedelta(days=offset)).strftime("%d.%m.%Y")
-        row.append(date)
-        if len(row) == 3:
-            rows.append(row)
-            row = []
-    if row:
-        rows.append(row)
+    return _schedule_date_keyboard(days, date.today())
+
+
+@lru_cache(maxsize=8)
+def _schedule_date_keyboard(days: int, today: date) -> ReplyKeyboardMarkup:
+    labels = [(today + timedelta(days=offset)).strftime("%d.%m.%Y") for offset in range(days)]
+    rows = _chunk(labels, 3)
     rows.append(["⬅️ Назад"])
     return build_keyboard(rows)
 
 
+@lru_cache(maxsize=None)
 def schedule_time_keyboard(step_minutes: int = 30) -> ReplyKeyboardMarkup:
-    rows: list[list[str]] = []
-    row: list[str] = []
-    hour = 0
-    while hour < 24:
-        for minute in range(0, 60, step_minutes):
-            row.append(f"{hour:02d}:{minute:02d}")
-            if len(row) == 4:
-                rows.append(row)
-                row = []
-        hour += 1
-    if row:
-        rows.append(row)
+    labels = [
+        f"{hour:02d}:{minute:02d}"
+        for hour in range(24)
+        for minute in range(0, 60, step_minutes)
+    ]
+    rows = _chunk(labels, 4)
     rows.append(["⬅️ Назад"])
     return build_keyboard(rows)
 
@@ -2,16 +2,25 @@ from __future__ import annotations
 
 import asyncio
 import logging
+from datetime import datetime, timezone
+from io import BytesIO
 from typing import Any
 
-from telegram import InputMediaPhoto
 from telegram.error import TelegramError
 
 from crosspost_bot.database import Database
+from crosspost_bot.services.telegram import (
+    DOWNLOAD_CONCURRENCY,
+    download_photo,
+    send_to_telegram,
+)
 from crosspost_bot.services.vk_client import VKClient
 
 LOGGER = logging.getLogger(__name__)
 
+POST_CONCURRENCY = 8
+POLL_INTERVAL = 60
+
 
 class ScheduledPostWorker:
     def __init__(self, *, db: Database, vk_client: VKClient, bot):
@@ -20,13 +29,20 @@ class ScheduledPostWorker:
         self.bot = bot
         self._task: asyncio.Task | None = None
         self._stop_event = asyncio.Event()
+        # Set by notify_new_post() and stop() to cut the idle sleep short.
+        self._wakeup = asyncio.Event()
+        self._post_semaphore = asyncio.Semaphore(POST_CONCURRENCY)
 
     def start(self) -> None:
         if not self._task:
             self._task = asyncio.create_task(self._run(), name="scheduled-post-worker")
 
+    def notify_new_post(self) -> None:
+        self._wakeup.set()
+
     async def stop(self) -> None:
         self._stop_event.set()
+        self._wakeup.set()
         if self._task:
             await self._task
             self._task = None
@@ -35,52 +51,72 @@ class ScheduledPostWorker:
         LOGGER.info("Scheduled post worker started")
         try:
             while not self._stop_event.is_set():
-                posts = await self.db.due_posts()
-                for post in posts:
-                    try:
-                        await self._send_post(post)
-                        await self.db.mark_post_sent(post["id"])
-                    except Exception:
-                        LOGGER.exception("Failed to send scheduled post %s", post["id"])
-                        await self.db.mark_post_sent(post["id"], status="failed")
                 try:
-                    await asyncio.wait_for(self._stop_event.wait(), timeout=60)
+                    timeout = await self._tick()
+                except Exception:
+                    LOGGER.exception("Scheduled post worker tick failed; retrying")
+                    timeout = POLL_INTERVAL
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
                 except asyncio.TimeoutError:
-                    continue
+                    pass
+                self._wakeup.clear()
         finally:
             LOGGER.info("Scheduled post worker stopped")
 
+    async def _tick(self) -> float:
+        """Send due posts and return how long to sleep before the next tick."""
+        # Posts stranded by a worker that died mid-send go back to the queue
+        # once their lease runs out; live claims are left alone.
+        await self.db.release_claimed_posts()
+        posts = await self.db.due_posts()
+        await asyncio.gather(*(self._process_post(post) for post in posts))
+        return await self._idle_timeout()
+
+    async def _idle_timeout(self) -> float:
+        next_due = await self.db.next_due_at()
+        if next_due is None:
+            return POLL_INTERVAL
+        delay = (next_due - datetime.now(timezone.utc)).total_seconds()
+        return min(POLL_INTERVAL, max(0.0, delay))
+
+    async def _process_post(self, post: dict[str, Any]) -> None:
+        # The outcome is written as soon as this post finishes, so a post that
+        # went out is never left 'processing' behind slower posts in the batch.
+        # A cancelled send writes nothing; the post stays in 'processing' and is
+        # requeued by release_claimed_posts once its lease expires.
+        async with self._post_semaphore:
+            try:
+                await self._send_post(post)
+                status = "sent"
+            except Exception:
+                LOGGER.exception("Failed to send scheduled post %s", post["id"])
+                status = "failed"
+        try:
+            await self.db.mark_posts_sent([post["id"]], status=status)
+        except Exception:
+            LOGGER.exception(
+                "Failed to record status %r for scheduled post %s", status, post["id"]
+            )
+
     async def _send_post(self, post: dict[str, Any]) -> None:
         text = post.get("text")
         media = post.get("media") or []
         telegram_channel = post["telegram_channel"]
         vk_group_id = post["vk_group_id"]
 
-        await self._send_to_telegram(telegram_channel, text, media)
-        await self._send_to_vk(vk_group_id, text, media)
+        results = await asyncio.gather(
+            self._send_to_telegram(telegram_channel, text, media),
+            self._send_to_vk(vk_group_id, text, media),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
 
     async def _send_to_telegram(self, channel: str, text: str | None, media: list) -> None:
         try:
-            if media:
-                if len(media) == 1:
-                    await self.bot.send_photo(
-                        chat_id=channel,
-                        photo=media[0]["file_id"],
-                        caption=text or "",
-                    )
-                else:
-                    group = []
-                    for index, item in enumerate(media):
-                        caption = text if index == 0 else None
-                        group.append(
-                            InputMediaPhoto(
-                                media=item["file_id"],
-                                caption=caption,
-                            )
-                        )
-                    await self.bot.send_media_group(chat_id=channel, media=group)
-            else:
-                await self.bot.send_message(chat_id=channel, text=text or "")
+            await send_to_telegram(self.bot, channel, text, media)
         except TelegramError as exc:
             LOGGER.error("Telegram send error: %s", exc)
             raise
@@ -88,15 +124,14 @@ class ScheduledPostWorker:
     async def _send_to_vk(self, group_id: str, text: str | None, media: list) -> None:
         attachments = None
         if media:
-            attachments = []
-            for item in media:
-                telegram_file = await self.bot.get_file(item["file_id"])
-                data = await telegram_file.download_as_bytearray()
-                attachments.append(
-                    (f"{item.get('file_unique_id', 'photo')}.jpg", bytes(data))
-                )
-        await asyncio.to_thread(
-            self.vk_client.post_to_group,
+            semaphore = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+
+            async def fetch(item: dict[str, Any]) -> BytesIO:
+                async with semaphore:
+                    return await download_photo(self.bot, item)
+
+            attachments = await asyncio.gather(*(fetch(item) for item in media))
+        await self.vk_client.post_to_group_async(
             group_id=group_id,
             message=text,
             photo_files=attachments,
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from io import BytesIO
+from typing import Any
+
+from telegram import InputMediaPhoto
+
+
+__all__ = ["DOWNLOAD_CONCURRENCY", "download_photo", "send_to_telegram"]
+
+DOWNLOAD_CONCURRENCY = 4
+
+
+async def send_to_telegram(
+    bot, chat_id: str, text: str | None, media: list[dict[str, Any]] | None
+) -> None:
+    if not media:
+        await bot.send_message(chat_id=chat_id, text=text or "")
+    elif len(media) == 1:
+        # sendMediaGroup only accepts 2-10 items.
+        await bot.send_photo(chat_id=chat_id, photo=media[0]["file_id"], caption=text or "")
+    else:
+        group = [
+            InputMediaPhoto(media=item["file_id"], caption=text if index == 0 else None)
+            for index, item in enumerate(media)
+        ]
+        await bot.send_media_group(chat_id=chat_id, media=group)
+
+
+async def download_photo(bot, item: dict[str, Any]) -> BytesIO:
+    """Download a Telegram photo into a named buffer ready for VK upload."""
+    telegram_file = await bot.get_file(item["file_id"])
+    buffer = BytesIO()
+    await telegram_file.download_to_memory(out=buffer)
+    buffer.seek(0)
+    buffer.name = f"{item.get('file_unique_id', 'photo')}.jpg"
+    return buffer
@@ -1,42 +1,78 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-import os
 import re
-import tempfile
-from typing import Iterable, Optional
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache, partial
+from typing import Any, BinaryIO, Callable, Iterable, Optional
 
 import vk_api
 
 
+__all__ = ["VKClient", "extract_token_from_url"]
+
 LOGGER = logging.getLogger(__name__)
 
 TOKEN_PATTERN = re.compile(r"access_token=([a-zA-Z0-9._-]+)")
+PHOTO_CACHE_SIZE = 1024
+VK_WORKERS = 4
 
 
 def extract_token_from_url(value: str) -> Optional[str]:
     if not value:
         return None
-    match = TOKEN_PATTERN.search(value)
-    if match:
-        return match.group(1)
+    if "access_token=" in value:
+        match = TOKEN_PATTERN.search(value)
+        if match:
+            return match.group(1)
     if len(value) > 80 and "vk1." in value:
         return value
     return None
 
 
+@lru_cache(maxsize=256)
+def _normalize_group_id(group_id: str) -> int:
+    group_id = group_id.strip()
+    if group_id.startswith("-"):
+        return int(group_id)
+    if group_id.startswith("club"):
+        group_id = group_id[4:]
+    return -abs(int(group_id))
+
+
 class VKClient:
     def __init__(self, token: str):
         self._token = token
         self._vk_session = vk_api.VkApi(token=token)
         self._api = self._vk_session.get_api()
-        self._upload = vk_api.VkUpload(self._vk_session)
+        # (owner_id, photo key) -> uploaded "photo<owner>_<id>" attachment.
+        self._photo_cache: OrderedDict[tuple[int, str], str] = OrderedDict()
+        self._photo_cache_lock = threading.Lock()
+        # vk_api is blocking; keep its calls off the loop's default executor.
+        self._executor = ThreadPoolExecutor(
+            max_workers=VK_WORKERS, thread_name_prefix="vk"
+        )
+
+    @cached_property
+    def _upload(self) -> vk_api.VkUpload:
+        # Only photo posts need the uploader; text-only clients never build it.
+        return vk_api.VkUpload(self._vk_session)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    async def _run_blocking(self, func: Callable[..., Any], **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, **kwargs))
 
     def update_token(self, token: str) -> None:
         self._token = token
-        self._vk_session = vk_api.VkApi(token=token)
-        self._api = self._vk_session.get_api()
-        self._upload = vk_api.VkUpload(self._vk_session)
+        # VkApi reads the token on every call; the API proxy and uploader hold
+        # the session itself, so swapping it keeps the pooled HTTP connections.
+        self._vk_session.token = {"access_token": token}
 
     def validate(self) -> bool:
         try:
@@ -46,54 +82,57 @@ class VKClient:
             LOGGER.error("VK token validation failed: %s", exc)
             return False
 
-    @staticmethod
-    def _normalize_group_id(group_id: str) -> int:
-        group_id = group_id.strip()
-        if group_id.startswith("-"):
-            return int(group_id)
-        if group_id.startswith("club"):
-            group_id = group_id[4:]
-        return -abs(int(group_id))
+    def cached_photo(self, group_id: str, key: str) -> Optional[str]:
+        cache_key = (_normalize_group_id(group_id), key)
+        with self._photo_cache_lock:
+            attachment = self._photo_cache.get(cache_key)
+            if attachment is not None:
+                self._photo_cache.move_to_end(cache_key)
+        return attachment
+
+    def upload_photo(
+        self,
+        *,
+        group_id: str,
+        photo: BinaryIO,
+        cache_key: Optional[str] = None,
+    ) -> str:
+        """Upload a named, readable file object such as a BytesIO."""
+        owner_id = _normalize_group_id(group_id)
+        try:
+            uploaded = self._upload.photo_wall(photos=[photo], group_id=abs(owner_id))
+        except vk_api.ApiError as exc:
+            LOGGER.exception("Failed to upload VK photo: %s", exc)
+            raise
+        photo = uploaded[0]
+        attachment = f"photo{photo['owner_id']}_{photo['id']}"
+        if cache_key:
+            with self._photo_cache_lock:
+                self._photo_cache[(owner_id, cache_key)] = attachment
+                if len(self._photo_cache) > PHOTO_CACHE_SIZE:
+                    self._photo_cache.popitem(last=False)
+        return attachment
 
     def post_to_group(
         self,
         *,
         group_id: str,
         message: Optional[str],
-        photo_files: Optional[Iterable[tuple[str, bytes]]] = None,
+        photo_files: Optional[Iterable[BinaryIO]] = None,
+        attachments: Optional[Iterable[str]] = None,
     ) -> dict:
-        owner_id = self._normalize_group_id(group_id)
-        attachments: list[str] = []
-        if photo_files:
-            temp_files = []
-            try:
-                for idx, (filename, data) in enumerate(photo_files):
-                    suffix = os.path.splitext(filename or "photo.jpg")[1] or ".jpg"
-                    with tempfile.NamedTemporaryFile(
-                        delete=False, suffix=suffix, prefix=f"vk_upload_{idx}_"
-                    ) as tmp:
-                        tmp.write(data)
-                        temp_files.append(tmp.name)
-                try:
-                    uploaded = self._upload.photo_wall(
-                        photos=temp_files, group_id=abs(owner_id)
-                    )
-                    for photo in uploaded:
-                        attachments.append(f"photo{photo['owner_id']}_{photo['id']}")
-                except vk_api.ApiError as exc:
-                    LOGGER.exception("Failed to upload VK photo: %s", exc)
-                    raise
-            finally:
-                for tmp_path in temp_files:
-                    try:
-                        os.unlink(tmp_path)
-                    except OSError:
-                        pass
+        owner_id = _normalize_group_id(group_id)
+        attachment_ids = None
+        if photo_files or attachments:
+            uploaded = list(attachments or ())
+            for photo in photo_files or ():
+                uploaded.append(self.upload_photo(group_id=group_id, photo=photo))
+            attachment_ids = ",".join(uploaded) or None
         try:
             response = self._api.wall.post(
                 owner_id=owner_id,
                 message=message or "",
-                attachments=",".join(attachments) if attachments else None,
+                attachments=attachment_ids,
                 from_group=True,
             )
             LOGGER.info("VK post created: %s", response)
@@ -102,4 +141,10 @@ class VKClient:
             LOGGER.exception("Failed to post in VK: %s", exc)
             raise
 
+    async def upload_photo_async(self, **kwargs: Any) -> str:
+        return await self._run_blocking(self.upload_photo, **kwargs)
+
+    async def post_to_group_async(self, **kwargs: Any) -> dict:
+        return await self._run_blocking(self.post_to_group, **kwargs)
+
 